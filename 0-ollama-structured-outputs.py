@@ -15,7 +15,8 @@ response = chat(
         }
     ],
     model='deepseek-r1:1.5b',
-    format=Country.model_json_schema()
+    format=Country.model_json_schema(),
+    keep_alive='30m'
 )
 
 country = Country.model_validate_json(response.message.content)
@@ -1,8 +1,15 @@
-from ollama import chat, generate
-from pydantic import BaseModel, Field
+from ollama import generate
+from pydantic import BaseModel, Field, TypeAdapter
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 import logging
+import asyncio
+
+from core.llm_cache import cached_chat
+from core.llm_client import OrjsonAsyncClient
+from core.schemas import ConfidenceScore
+from core.semantic_cache import semantic_cache
+from core.streaming_json import StreamingJsonParser
 
 # Set logging config
 logging.basicConfig(
@@ -12,6 +19,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+client = OrjsonAsyncClient()
+
+# Keep the model resident across the stages of the chain and across requests.
+# keep_alive=0 evicts the model right after the call, only use it on shutdown.
+KEEP_ALIVE = '30m'
+
+# Small quantized model for classification, reasoning model for extraction and writing
+CLASSIFIER_MODEL = 'smollm2:360m-instruct-q4_0'
+REASONER_MODEL = 'deepseek-r1:1.5b'
+
+def warm_up(fused: bool = True) -> None:
+    """Load the models the chain calls before the first request so it doesn't pay the load cost"""
+    # The fused chain never calls the classifier model
+    warm_models = (REASONER_MODEL,) if fused else (CLASSIFIER_MODEL, REASONER_MODEL)
+    for warm_model in warm_models:
+        generate(model=warm_model, prompt='', keep_alive=KEEP_ALIVE)
+
 # Define data models
 
 class EventValidation(BaseModel):
@@ -20,17 +44,17 @@ class EventValidation(BaseModel):
     is_calender_event: bool = Field(
         description='Whether this text describes a calender event'
         )
-    confidence_score: float = Field(
+    confidence_score: ConfidenceScore = Field(
         description='Confidence score between 0 and 1'
     )
 
 class EventDetails(BaseModel):
     """Parse event details"""
 
-    name: str = Field(description="Name of the event")
+    name: str = Field(min_length=1, description="Name of the event")
     description: str = Field(description="Description of the purpose of the event")
-    date: str = Field(description="Date and time of the event. Use ISO 8601 to format this value")
-    duration_minutes: int = Field(description="Expected duration in minutes")
+    date: datetime = Field(description="Date and time of the event. Use ISO 8601 to format this value")
+    duration_minutes: int = Field(ge=0, le=1440, description="Expected duration in minutes")
     participants: list[str] = Field(description="List of participants")    
 
 class EventConfirmation(BaseModel):
@@ -40,134 +64,260 @@ class EventConfirmation(BaseModel):
         description="Natural language confirmation message"
     )
 
+class CombinedEventResult(BaseModel):
+    """Validate the event and extract its details in a single call"""
+
+    validation: EventValidation
+    details: Optional[EventDetails] = Field(
+        default=None,
+        description="Event details, null unless the text is a calender event"
+    )
+
+# Response schemas are built once instead of on every call
+_VALIDATION_SCHEMA = EventValidation.model_json_schema()
+_DETAILS_SCHEMA = EventDetails.model_json_schema()
+_CONFIRM_SCHEMA = EventConfirmation.model_json_schema()
+_COMBINED_SCHEMA = CombinedEventResult.model_json_schema()
+
+# Validators are compiled once and reused to parse every response
+_VALIDATION_TA = TypeAdapter(EventValidation)
+_DETAILS_TA = TypeAdapter(EventDetails)
+_CONFIRM_TA = TypeAdapter(EventConfirmation)
+_COMBINED_TA = TypeAdapter(CombinedEventResult)
+
 # Define funcitons
 
-def validate_event(user_input: str) -> EventValidation:
+def shared_prefix(date_context: str) -> str:
+    """Common start of every system prompt.
+
+    Kept byte-identical across the stages so Ollama can reuse the KV cache
+    for the prefix instead of processing it again on every call.
+    """
+    return f"{date_context}\nYou are a calendar assistant.\n"
+
+# Stage instructions appended to the shared prefix, kept terse since the
+# response schema already fixes the output shape
+_VALIDATE_SYS = 'Classify if the text is a calender event. Score confidence 0-1.'
+_EXTRACT_SYS = 'Extract event fields. Resolve relative dates from today.'
+_CONFIRM_SYS = 'Write a friendly confirmation with name, description, date and participants. No extras.'
+_COMBINED_SYS = 'Classify if the text is a calender event. Score confidence 0-1. Only if it is one with confidence >= 0.7, extract event fields, resolving relative dates from today. Otherwise details is null.'
+
+# Only the unfused chain calls this stage, so only it uses the semantic cache
+@semantic_cache(threshold=0.92, namespace="validate_event")
+async def validate_event(user_input: str, date_context: str) -> EventValidation:
     """First LLM call to determine if input is a calender event that can be created on a calender with name, place, date, recipients etc."""
     logger.info("Starting event extraction analysis")
-    logger.debug(f"Input text: {user_input}")
-
-    today = datetime.now()
-    date_context = f"Today is {today.strftime('%A, %B %d, %Y')}"
+    logger.debug("Input text: %s", user_input)
 
-    response = chat(
+    event_validation = await cached_chat(
+        client,
         messages=[
             {
                 'role': 'system', 
-                'content': f'''{date_context} Analyze if the text describes a calender event and provide a confidence score between 0 and 1 about the decision.'''
+                'content': shared_prefix(date_context) + _VALIDATE_SYS
             },
             {
                 'role': 'user',
                 'content': user_input
             }
         ],
-        model='deepseek-r1:1.5b',
-        options={'temperature': 0},
-        format=EventValidation.model_json_schema()
+        model=CLASSIFIER_MODEL,
+        options={'temperature': 0, 'num_predict': 128},
+        format=_VALIDATION_SCHEMA,
+        keep_alive=KEEP_ALIVE,
+        adapter=_VALIDATION_TA
     )
 
-    event_validation = EventValidation.model_validate_json(response.message.content)
     logger.info(
-        f"Validation complete - Is calender event: {event_validation.is_calender_event}, confidence: {event_validation.confidence_score:.2f}"
+        "Validation complete - Is calender event: %s, confidence: %.2f",
+        event_validation.is_calender_event,
+        event_validation.confidence_score
     )
     return event_validation
 
-def extract_event_details(description: str) -> EventDetails:
+async def extract_event_details(description: str, date_context: str) -> EventDetails:
     """Second LLM call to extract event details"""
     logger.info("Starting event details parsing")
 
-    today = datetime.now()
-    date_context = f"Today is {today.strftime('%A, %B %d, %Y')}"
-
-    response = chat(
+    event_details = await cached_chat(
+        client,
         messages=[
             {
                 'role': 'system',
-                'content': f'{date_context} Extract detailed event information. When dates referece "next tuesday" or similar relative details, use today as reference and calculate the date. Return response as JSON'
+                'content': shared_prefix(date_context) + _EXTRACT_SYS
             },
             {
                 'role': 'user',
                 'content': description
             }
         ],
-        model='deepseek-r1:1.5b',
-        options={'temperature': 0},
-        format=EventDetails.model_json_schema()
+        model=REASONER_MODEL,
+        options={'temperature': 0, 'num_predict': 256},
+        format=_DETAILS_SCHEMA,
+        keep_alive=KEEP_ALIVE,
+        adapter=_DETAILS_TA
     )
 
-    event_details = EventDetails.model_validate_json(response.message.content)
     return event_details
 
-def generate_confirmation(event_details: EventDetails) -> EventConfirmation:
-    """Third LLM call to generate a confirmation message"""
+async def generate_confirmation(
+    event_details: EventDetails,
+    date_context: str,
+    on_text: Optional[Callable[[str], None]] = None
+) -> EventConfirmation:
+    """Third LLM call to generate a confirmation message.
+
+    With `on_text` the response is streamed and the confirmation message is
+    passed to it piece by piece as it is generated.
+    """
     logger.info("Generating confirmation message")
 
-    response = chat(
+    on_chunk = None
+    if on_text is not None:
+        parser = StreamingJsonParser(
+            on_text=lambda field, text: on_text(text) if field == 'confirmation_message' else None
+        )
+        on_chunk = parser.feed
+
+    confirmation = await cached_chat(
+        client,
         messages=[
             {
                 'role': 'system',
-                'content': '''Generate a natural language calendar event add confirmation message for the event in a friendly tone. Include meeting name,
-                            description, date and participants. Don't include any other information. Don't be creative.'''
+                'content': shared_prefix(date_context) + _CONFIRM_SYS
             },
             {
                 'role': 'user',
-                'content': str(event_details.model_dump())
+                'content': event_details.model_dump_json()
             }
         ],
-        model='deepseek-r1:1.5b',
-        options={'temperature': 0},
-        format=EventConfirmation.model_json_schema(),
-        keep_alive='0m'
+        model=REASONER_MODEL,
+        options={'temperature': 0, 'num_predict': 256},
+        format=_CONFIRM_SCHEMA,
+        keep_alive=KEEP_ALIVE,
+        on_chunk=on_chunk,
+        adapter=_CONFIRM_TA
     )
 
-    confirmation = EventConfirmation.model_validate_json(response.message.content)
     logger.info("Confirmation message generated successfully")
     return confirmation
 
+async def validate_and_extract_event(user_input: str, date_context: str) -> CombinedEventResult:
+    """Single LLM call replacing the first two stages of the chain"""
+    logger.info("Starting combined event validation and details parsing")
+    logger.debug("Input text: %s", user_input)
+
+    result = await cached_chat(
+        client,
+        messages=[
+            {
+                'role': 'system',
+                'content': shared_prefix(date_context) + _COMBINED_SYS
+            },
+            {
+                'role': 'user',
+                'content': user_input
+            }
+        ],
+        model=REASONER_MODEL,
+        options={'temperature': 0, 'num_predict': 384},
+        format=_COMBINED_SCHEMA,
+        keep_alive=KEEP_ALIVE,
+        adapter=_COMBINED_TA
+    )
+
+    logger.info(
+        "Combined validation complete - Is calender event: %s, confidence: %.2f",
+        result.validation.is_calender_event,
+        result.validation.confidence_score
+    )
+    return result
+
 # Chaining prompts
 
-def proces_calender_request(user_input: str) -> Optional[EventConfirmation]:
-    """Chained LLM prompts with checks"""
+async def proces_calender_request(
+    user_input: str,
+    fused: bool = True,
+    on_confirmation_text: Optional[Callable[[str], None]] = None
+) -> Optional[EventConfirmation]:
+    """Chained LLM prompts with checks.
+
+    With `fused` the validation and extraction stages share one LLM call,
+    otherwise they run as two concurrent calls, and only then are similar
+    inputs answered from the semantic cache. `on_confirmation_text`
+    receives the confirmation message as it is streamed.
+    """
     logger.info("Processing calendar request")
-    logger.debug(f"Raw input: {user_input}")
+    logger.debug("Raw input: %s", user_input)
 
-    # First LLM call: Validate request
-    validation = validate_event(user_input=user_input)
+    # Resolve the date once so every stage sees the same day and prompt prefix
+    today = datetime.now()
+    date_context = f"Today is {today.strftime('%A, %B %d, %Y')}"
+
+    if fused:
+        # First LLM call: Validate request and extract event information together
+        result = await validate_and_extract_event(
+            user_input=user_input,
+            date_context=date_context
+        )
+        validation, event_details = result.validation, result.details
+    else:
+        # First and second LLM calls: Validate request and speculatively extract
+        # the event information at the same time, both only depend on the input
+        validation, event_details = await asyncio.gather(
+            validate_event(user_input=user_input, date_context=date_context),
+            extract_event_details(description=user_input, date_context=date_context)
+        )
 
     # Gate check: Verify for a calendar event with sufficient confidence
-    if (not validation.is_calender_event) or (validation.confidence_score < 0.7):
+    if (
+        not validation.is_calender_event
+        or validation.confidence_score < 0.7
+        or event_details is None
+    ):
         logger.warning(
-            f"Validation failed - is_calendar_event: {validation.is_calender_event}, confindence: {validation.confidence_score}"
+            "Validation failed - is_calendar_event: %s, confindence: %s",
+            validation.is_calender_event,
+            validation.confidence_score
         )
         return None
     
     logger.info("Validation passed. proceeding wit event processing")
 
-    # Second LLM call: Extract event information
-    event_details = extract_event_details(description=user_input)
-
     # Third LLM call: Generate confirmation message
-    confirmation = generate_confirmation(event_details=event_details)
+    confirmation = await generate_confirmation(
+        event_details=event_details,
+        date_context=date_context,
+        on_text=on_confirmation_text
+    )
 
     logger.info("Calendar request processing completed successfully")
     return confirmation
 
 # Test
 
-# Valid input
+async def main():
+    # Valid input
+    user_input = "Let's schedule a 1h team meeting next Tuesday at 2pm with Alice and Bob to discuss the project roadmap."
+    # Print the confirmation message while it is being generated
+    result = await proces_calender_request(
+        user_input=user_input,
+        on_confirmation_text=lambda text: print(text, end="", flush=True)
+    )
+    if result:
+        print()
+    else:
+        print("This doesn't appear to be a calendar event request.")
 
-user_input = "Let's schedule a 1h team meeting next Tuesday at 2pm with Alice and Bob to discuss the project roadmap."
-result = proces_calender_request(user_input=user_input)
-if result:
-    print(f"Confirmation: {result.confirmation_message}")
-else:
-    print("This doesn't appear to be a calendar event request.")
+    # Invalid input 
 
-# Invalid input 
+    # user_input = "Generate a poem about roses"
+    # result = await proces_calender_request(user_input=user_input)
+    # if result:
+    #     print(f"Confirmation: {result.confirmation_message}")
+    # else:
+    #     print("This doesn't appear to be a calendar event request.")
 
-# user_input = "Generate a poem about roses"
-# result = proces_calender_request(user_input=user_input)
-# if result:
-#     print(f"Confirmation: {result.confirmation_message}")
-# else:
-#     print("This doesn't appear to be a calendar event request.")
\ No newline at end of file
+if __name__ == '__main__':
+    warm_up()
+    asyncio.run(main())
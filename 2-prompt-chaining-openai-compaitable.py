@@ -1,9 +1,13 @@
-from openai import OpenAI
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import Optional
 from datetime import datetime
 import os
 import logging
+import asyncio
+
+from core.llm_cache import cached_parse
+from core.llm_client import get_async_client
+from core.schemas import ConfidenceScore
 
 # Set up logging
 logging.basicConfig(
@@ -13,11 +17,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create an OpenAI client with ollama openai compaitable API
-client = OpenAI(
-    base_url="http://localhost:11434/v1",
-    api_key="ollama"
-)
+# Shared OpenAI client with ollama openai compaitable API
+client = get_async_client()
 model = "deepseek-r1:1.5b"
 
 # Define data models
@@ -28,7 +29,7 @@ class EventValidation(BaseModel):
     is_calendar_event: bool = Field(
         description="Whether the text describes a calendar event"
     )
-    confidence_score: float = Field(
+    confidence_score: ConfidenceScore = Field(
         description="Confidence score between 0 and 1"
     )
 
@@ -36,12 +37,14 @@ class EventDetails(BaseModel):
     """Event Details"""
 
     name: str = Field(
+        min_length=1,
         description="Name of the event"
     )
     date: datetime = Field(
         description="Date and time of the event. Use YYYY-MM-DD format"
     )
     duration_minutes: int = Field(
+        ge=0, le=1440,
         description="Event duration in minutes"
     )
     participants: list[str] = Field(
@@ -55,15 +58,31 @@ class EventConfirmation(BaseModel):
         description="Natural Language confirmation message"
     )
 
+class CombinedEventResult(BaseModel):
+    """Event validation and details from a single LLM call"""
+
+    validation: EventValidation
+    details: Optional[EventDetails] = Field(
+        default=None,
+        description="Event details, null unless the text describes a calendar event"
+    )
+
+# Validators are compiled once and reused to parse every response
+_VALIDATION_TA = TypeAdapter(EventValidation)
+_DETAILS_TA = TypeAdapter(EventDetails)
+_CONFIRM_TA = TypeAdapter(EventConfirmation)
+_COMBINED_TA = TypeAdapter(CombinedEventResult)
+
 # Define functions
 
-def validate_event(user_input: str) -> EventValidation:
+async def validate_event(user_input: str) -> EventValidation:
     """First LLM call to determine if the user input is a
     valid calender event"""
     logger.info("Starting event validation")
-    logger.debug(f"Input text: {user_input}")
+    logger.debug("Input text: %s", user_input)
 
-    response = client.beta.chat.completions.parse(
+    result = await cached_parse(
+        client,
         messages=[
             {
                 "role": "system",
@@ -76,16 +95,18 @@ def validate_event(user_input: str) -> EventValidation:
         ],
         model=model,
         temperature=0,
-        response_format=EventValidation
+        response_format=EventValidation,
+        adapter=_VALIDATION_TA
     )
 
-    result = response.choices[0].message.parsed
     logger.info(
-        f"Extraction complete - Is calendar event: {result.is_calendar_event}, Confidence: {result.confidence_score:.2f}"
+        "Extraction complete - Is calendar event: %s, Confidence: %.2f",
+        result.is_calendar_event,
+        result.confidence_score
     )
     return result
 
-def extract_event(user_input: str) -> EventDetails:
+async def extract_event(user_input: str) -> EventDetails:
     """Second LLM call to extract the event details"""
 
     logger.info("Starting event details parsing")
@@ -93,7 +114,8 @@ def extract_event(user_input: str) -> EventDetails:
     today = datetime.now()
     date_context = f"Today is {today.strftime('%A, %B %d, %Y')}."
 
-    response = client.beta.chat.completions.parse(
+    result = await cached_parse(
+        client,
         messages=[
             {
                 "role": "system",
@@ -107,20 +129,24 @@ def extract_event(user_input: str) -> EventDetails:
         ],
         model=model,
         temperature=0,
-        response_format=EventDetails
+        response_format=EventDetails,
+        adapter=_DETAILS_TA
     )
 
-    result = response.choices[0].message.parsed
     logger.info(
-        f"Parsed event details - Name: {result.name}, Date: {result.date}, Duration: {result.duration_minutes}min"
+        "Parsed event details - Name: %s, Date: %s, Duration: %smin",
+        result.name,
+        result.date,
+        result.duration_minutes
     )
-    logger.debug(f"Participants: {', '.join(result.participants)}")
+    logger.debug("Participants: %s", ', '.join(result.participants))
     return result
 
-def generate_confirmation(event_details: EventDetails) -> EventConfirmation:
+async def generate_confirmation(event_details: EventDetails) -> EventConfirmation:
     """Third LLM call to generate a confirmation message"""
 
-    response = client.beta.chat.completions.parse(
+    result = await cached_parse(
+        client,
         messages=[
             {
                 "role": "system",
@@ -128,55 +154,108 @@ def generate_confirmation(event_details: EventDetails) -> EventConfirmation:
             },
             {
                 "role": "user",
-                "content": str(event_details.model_dump())
+                "content": event_details.model_dump_json()
             }
         ],
         model=model,
         temperature=0,
-        response_format=EventConfirmation
+        response_format=EventConfirmation,
+        adapter=_CONFIRM_TA
     )
 
-    result = response.choices[0].message.parsed
     logger.info("Confirmation message generated successfully")
     return result
 
+async def validate_and_extract_event(user_input: str) -> CombinedEventResult:
+    """Single LLM call validating the user input and extracting the event details"""
+    logger.info("Starting combined event validation and details parsing")
+    logger.debug("Input text: %s", user_input)
+
+    today = datetime.now()
+    date_context = f"Today is {today.strftime('%A, %B %d, %Y')}."
+
+    result = await cached_parse(
+        client,
+        messages=[
+            {
+                "role": "system",
+                "content": f"""Analyze thoroughly if the text describes a calendar event. If and only if is_calendar_event
+                            is true and confidence_score is at least 0.7, also extract detailed event information. When dates
+                            reference 'next tuesday' or similar relative dates use today to calculate the meeting date in
+                            YYYY-MM-DD format. Otherwise set details to null. {date_context}"""
+            },
+            {
+                "role": "user",
+                "content": user_input
+            }
+        ],
+        model=model,
+        temperature=0,
+        response_format=CombinedEventResult,
+        adapter=_COMBINED_TA
+    )
+
+    logger.info(
+        "Combined extraction complete - Is calendar event: %s, Confidence: %.2f",
+        result.validation.is_calendar_event,
+        result.validation.confidence_score
+    )
+    return result
+
 # Chain functions
 
-def process_calendar_request(user_input: str) -> Optional[EventConfirmation]:
-    """Main function implementing the prompt chain"""
+async def process_calendar_request(user_input: str, fused: bool = True) -> Optional[EventConfirmation]:
+    """Main function implementing the prompt chain.
+
+    With `fused` validation and extraction share a single LLM call,
+    otherwise they run as two concurrent calls.
+    """
     logger.info("Processing calendar request")
-    logger.debug(f"Raw input: {user_input}")
+    logger.debug("Raw input: %s", user_input)
 
-    # First LLM call: validate the user input
-    validation = validate_event(user_input=user_input)
+    if fused:
+        # First LLM call: validate the user input and extract event details
+        result = await validate_and_extract_event(user_input=user_input)
+        validation, event_details = result.validation, result.details
+    else:
+        # First and second LLM calls: validate the user input and speculatively
+        # extract event details concurrently, both only depend on the user input
+        validation, event_details = await asyncio.gather(
+            validate_event(user_input=user_input),
+            extract_event(user_input=user_input)
+        )
 
     # Gate check: verify if the user input is a calendar event
     if (
         not validation.is_calendar_event or 
-        validation.confidence_score < 0.7
+        validation.confidence_score < 0.7 or
+        event_details is None
     ):
         logger.warning(
-            f"Gate check failed - is_calendar_event: {validation.is_calendar_event}, confidence: {validation.confidence_score}"
+            "Gate check failed - is_calendar_event: %s, confidence: %s",
+            validation.is_calendar_event,
+            validation.confidence_score
         )
         return None
 
     logger.info("Gate check passed, proceeding with event processing")
-    
-    # Second LLM call: extract event details
-    event_details = extract_event(user_input=user_input)
 
     # Third LLM call: generate confirmation
-    confirmation = generate_confirmation(event_details=event_details)
+    confirmation = await generate_confirmation(event_details=event_details)
 
     logger.info("Calendar request processing completed successfully")
     return confirmation
 
 # Test
 
-user_input = "Let's schedule a 1h team meeting next Tuesday at 2pm with Alice and Bob to discuss the project roadmap."
+async def main():
+    user_input = "Let's schedule a 1h team meeting next Tuesday at 2pm with Alice and Bob to discuss the project roadmap."
+
+    result = await process_calendar_request(user_input=user_input)
+    if result:
+        print(f"Confirmation: {result.confirmation_message}")
+    else:
+        print("This doesn't appear to be a calendar event request.")
 
-result = process_calendar_request(user_input=user_input)
-if result:
-    print(f"Confirmation: {result.confirmation_message}")
-else:
-    print("This doesn't appear to be a calendar event request.")
\ No newline at end of file
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,8 +1,23 @@
-from typing import Optional, Literal
-from pydantic import BaseModel, Field
-from openai import OpenAI
+from typing import Optional, Union
+from ollama import ResponseError
 import os
+import re
 import logging
+import asyncio
+
+from core.llm_client import get_async_client, parse
+from core.router_classifier import RouterClassifier
+from core.schemas import (
+    AssistantCommand,
+    AssistantRequestPlan,
+    AssistantRequestType,
+    AssistantResponse,
+    DoorConfigDetails,
+    EntertainmentConfigDetails,
+    LightConfigDetails,
+    RequestRoute,
+)
+from core.semantic_cache import semantic_cache
 
 # Configure logging
 logging.basicConfig(
@@ -13,224 +28,411 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(
-    base_url='http://localhost:11434/v1',
-    api_key='ollama'
-)
-model = 'deepseek-r1:8b'
+client = get_async_client()
 
-# Define Data Models
+# Small quantized model for routing, reasoning model for the handlers
+ROUTER_MODEL = 'qwen2.5:3b-instruct-q4_K_M'
+HANDLER_MODEL = 'deepseek-r1:8b'
 
-class AssistantRequestType(BaseModel):
-    """Router LLM  call: Determine the type of assistant request"""
+# System prompts are module constants, byte-identical on every call. Ollama's
+# prefix cache is per model, so only the router model's prompts share a preamble
+_ROUTER_PREAMBLE = (
+    'You are a home-assistant request parser. Requests are light configuration, '
+    'door configuration, entertainment configuration or other requests. '
+)
+_ROUTER_SYS = (
+    _ROUTER_PREAMBLE + 'Determine the type of this request. '
+    'Respond with the JSON object only. Do not think step by step.'
+)
+_SPLIT_SYS = _ROUTER_PREAMBLE + 'Split the text into individual commands and determine the type of each command.'
+# Public: scripts/bench_batch.py sends the same fused command call
+COMMAND_SYSTEM_PROMPT = (
+    'Determine if this request is related to light configuration, door configuration, '
+    'entertainment configuration or other request, and extract the details of the '
+    'configuration change. Set details to null for other requests.'
+)
+_LIGHT_SYS = 'Extract the details for light configuration change.'
+_DOOR_SYS = 'Extract the details for door configuration change.'
+_ENT_SYS = 'Extract the details for entertainment configuration change.'
+
+# Local router: seed examples per request type for the embedding classifier
+
+ROUTER_EXAMPLES = {
+    'light_config': [
+        'Change bedroom light to cool',
+        'Set the kitchen lights to warm',
+        'Make the living room light cooler',
+        'Switch the hallway lights to warm white',
+        'I want cool light in the office',
+        'Turn the bathroom light warm',
+        'Can you make the garage lights cool',
+        'Warm up the lights in the dining room',
+    ],
+    'door_config': [
+        'lock the front door',
+        'Unlock the back door',
+        'Please lock the garage door',
+        'Open the lock on the patio door',
+        'Is the side door locked? lock it',
+        'Unlock the main entrance',
+        'Secure the front door',
+        'Lock all the doors',
+    ],
+    'entertainment_config': [
+        'play some jazz',
+        'Stop the music',
+        'Pause the movie',
+        'Play rock music in the living room',
+        'Put on some classical music',
+        'Pause the TV',
+        'Stop playing',
+        'Play my favourite playlist',
+    ],
+    'other': [
+        'What is the weather today',
+        'Tell me a joke',
+        'Set an alarm for 7am',
+        'Order a pizza',
+        'How tall is Mount Everest',
+        'Remind me to call mom',
+        'Write a poem about roses',
+        'What time is it',
+        # Near misses of the supported actions
+        'Turn off the bedroom light',
+        'Dim the kitchen lights',
+        'Close the garage door',
+        'Turn up the volume',
+    ],
+}
+router_classifier = RouterClassifier(ROUTER_EXAMPLES)
+
+# Unambiguous keyword commands, checked in order before any model is involved.
+# Only keywords that map onto an allowed action of the details models are used.
+_MEDIA = r'(music|songs?|playlist|album|jazz|rock|pop|movie|film|show|tv|radio|podcast|video)'
+_FAST_PATTERNS = [
+    (re.compile(r'\b(lock|unlock)\b.*\bdoors?\b', re.IGNORECASE), 'door_config'),
+    (re.compile(r'\b(warm|cool)\b.*\blights?\b|\blights?\b.*\b(warm|cool)\b', re.IGNORECASE), 'light_config'),
+    (re.compile(rf'\b(play|pause|stop)\b.*\b{_MEDIA}\b|\b{_MEDIA}\b.*\b(play|pause|stop)\b', re.IGNORECASE), 'entertainment_config'),
+]
 
-    request_type: Literal['light_config', 
-                          'door_config', 
-                          'entertainment_config',
-                          'other'] = Field(
-                              description='Type of assistant request'
-                          )
-    confidence_score: float = Field(
-        description='Confidence score of the request type selection between 0 and 1'
-    )
-    description: str = Field(
-        description='Cleand request text'
-    )
+# Define routing and processing functions 
 
-class LightConfigDetails(BaseModel):
-    """Details of a light configuration change"""
+async def fast_route(user_input: str) -> Optional[AssistantRequestType]:
+    """Route the request without an LLM call, None when the input isn't clear enough"""
+    for pattern, request_type in _FAST_PATTERNS:
+        if pattern.search(user_input):
+            logger.info('Request matched keyword route: %s', request_type)
+            return AssistantRequestType(
+                request_type=request_type,
+                confidence_score=0.99,
+                description=user_input
+            )
+
+    try:
+        request_type, confidence = await router_classifier.predict(user_input)
+    except ResponseError as e:
+        logger.warning('Local router unavailable, falling back to LLM: %s', e)
+        return None
 
-    place: str = Field(
-        description='Place of the house where the light config change should be happened'
-    )
-    light_type: Literal['warm', 'cool'] = Field(
-        description='Type of the light'
+    if confidence < 0.8:
+        return None
+    logger.info('Request routed locally as: %s with confidence: %.2f', request_type, confidence)
+    return AssistantRequestType(
+        request_type=request_type,
+        confidence_score=confidence,
+        description=user_input
     )
 
-class DoorConfigDetails(BaseModel):
-    """Details of a door configuration change"""
+# Only the route is cached: a similar input must still be handled with its own text
+@semantic_cache(threshold=0.92, namespace='route_request_type')
+async def classify_agent_request(user_input: str) -> RequestRoute:
+    """Router LLM call to determine the type of assistant request"""
+    logger.info("Routing request")
 
-    place: str = Field(
-        description='Place of the house where the door config change should be happened'
-    )
-    action: Literal['lock', 'unlock'] = Field(
-        description='Action to be performed on the door lock'
+    result = await parse(
+        client,
+        messages=[
+            {
+                'role': 'system',
+                'content': _ROUTER_SYS
+            },
+            {
+                'role': 'user',
+                'content': user_input
+            }
+        ],
+        model=ROUTER_MODEL,
+        temperature=0,
+        top_p=1,
+        max_tokens=64,
+        response_model=RequestRoute
     )
 
-class EntertainmentConfigDetails(BaseModel):
-    """Details of a entertainment system configuration change"""
+    logger.info('Request routed as: %s with confidence: %s', result.request_type, result.confidence_score)
 
-    action: Literal['play', 'stop', 'pause'] = Field(
-        description='Action to be performed on the entertainment system'
-    )
-    genre: Optional[str]  = Field(
-        description='Requsted genre to be played'
-    )
-
-class AssistantResponse(BaseModel):
-    """Final response format"""
+    return result
 
-    status: str = Field(
-        description='Whether the configuration chage is successful'
-    )
-    message: str = Field(
-        description='User-friendly message'
+async def route_agent_request(user_input: str) -> AssistantRequestType:
+    """Route the request, the handler always gets the live user input"""
+    route = await classify_agent_request(user_input=user_input)
+    return AssistantRequestType(
+        request_type=route.request_type,
+        confidence_score=route.confidence_score,
+        description=user_input
     )
 
-# Define routing and processing functions 
+async def interpret_agent_request(user_input: str) -> AssistantCommand:
+    """Single LLM call routing the request and extracting its configuration details"""
+    logger.info("Interpreting request")
 
-def route_agent_request(user_input: str) -> AssistantRequestType:
-    """Router LLM call to determine the type of assistant request"""
-    logger.info("Routing request")
-
-    response = client.beta.chat.completions.parse(
+    result = await parse(
+        client,
         messages=[
             {
                 'role': 'system',
-                'content': '''Determine if this request is related to light configuration event or 
-                            door configuration or entertainment configuration or other request'''    
+                'content': COMMAND_SYSTEM_PROMPT
             },
             {
                 'role': 'user',
                 'content': user_input
             }
         ],
-        model=model,
+        model=HANDLER_MODEL,
         temperature=0,
-        response_format=AssistantRequestType
+        max_tokens=192,
+        response_model=AssistantCommand
     )
 
-    result = response.choices[0].message.parsed
-    logger.info(f'Request routed as: {result.request_type} with confidence: {result.confidence_score}')
+    logger.info('Request interpreted as: %s with confidence: %s', result.request_type, result.confidence_score)
 
     return result
 
-def handle_light_config(description: str) -> LightConfigDetails:
+def build_response(
+    details: Union[LightConfigDetails, DoorConfigDetails, EntertainmentConfigDetails]
+) -> AssistantResponse:
+    """Create the user-facing response for extracted configuration details"""
+    if details.request_type == 'light_config':
+        message = f'Light configuration change on {details.place} to {details.light_type}'
+    elif details.request_type == 'door_config':
+        message = f'Door configuration change on {details.place} to {details.action}'
+    else:
+        message = f'Entertainment configuration change to {details.action} {details.genre or ""}'
+
+    return AssistantResponse(status='success', message=message)
+
+async def handle_light_config(description: str) -> AssistantResponse:
     """LLM call to handle light configuraion change"""
     logger.info('Processing light configuraion change')
 
-    response = client.beta.chat.completions.parse(
+    result = await parse(
+        client,
         messages=[
             {
                 'role': 'system',
-                'content': 'Extract the details for light configuration change'
+                'content': _LIGHT_SYS
             },
             {
                 'role': 'user',
                 'content': description
             }
         ],
-        model=model,
+        model=HANDLER_MODEL,
         temperature=0,
-        response_format=LightConfigDetails
+        max_tokens=128,
+        response_model=LightConfigDetails
     )
 
-    result = response.choices[0].message.parsed
-    logger.info(f'Light configuraion: {result.model_dump_json(indent=2)}')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Light configuration: %s', result.model_dump_json())
 
     # Create response
-    return AssistantResponse(
-        status='success',
-        message=f'Light configuration change on {result.place} to {result.light_type}'
-    )
+    return build_response(result)
 
-def handle_door_config(description: str) -> DoorConfigDetails:
+async def handle_door_config(description: str) -> AssistantResponse:
     """LLM call to handle door configuraion change"""
     logger.info('Processing door configuraion change')
 
-    response = client.beta.chat.completions.parse(
+    result = await parse(
+        client,
         messages=[
             {
                 'role': 'system',
-                'content': 'Extract the details for door configuration change'
+                'content': _DOOR_SYS
             },
             {
                 'role': 'user',
                 'content': description
             }
         ],
-        model=model,
+        model=HANDLER_MODEL,
         temperature=0,
-        response_format=DoorConfigDetails
+        max_tokens=128,
+        response_model=DoorConfigDetails
     )
 
-    result = response.choices[0].message.parsed
-    logger.info(f'Door configuraion: {result.model_dump_json(indent=2)}')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Door configuration: %s', result.model_dump_json())
 
     # Create response
-    return AssistantResponse(
-        status='success',
-        message=f'Door configuration change on {result.place} to {result.action}'
-    )
+    return build_response(result)
 
-def handle_entertainment_config(description: str) -> EntertainmentConfigDetails:
+async def handle_entertainment_config(description: str) -> AssistantResponse:
     """LLM call to handle entertainment configuraion change"""
     logger.info('Processing entertainment configuraion change')
 
-    response = client.beta.chat.completions.parse(
+    result = await parse(
+        client,
         messages=[
             {
                 'role': 'system',
-                'content': 'Extract the details for entertainment configuration change.'
+                'content': _ENT_SYS
             },
             {
                 'role': 'user',
                 'content': description
             }
         ],
-        model=model,
+        model=HANDLER_MODEL,
         temperature=0,
-        response_format=EntertainmentConfigDetails
+        max_tokens=128,
+        response_model=EntertainmentConfigDetails
     )
 
-    result = response.choices[0].message.parsed
-    logger.info(f'Entertainment configuraion: {result.model_dump_json(indent=2)}')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Entertainment configuration: %s', result.model_dump_json())
 
     # Create response
-    return AssistantResponse(
-        status='success',
-        message=f'Entertainment configuration change to {result.action} {f'{result.genre}' if result.genre else ""}'
+    return build_response(result)
+
+async def split_agent_request(user_input: str) -> AssistantRequestPlan:
+    """Router LLM call to split the input into individual typed requests"""
+    logger.info("Splitting request into commands")
+
+    result = await parse(
+        client,
+        messages=[
+            {
+                'role': 'system',
+                'content': _SPLIT_SYS
+            },
+            {
+                'role': 'user',
+                'content': user_input
+            }
+        ],
+        model=ROUTER_MODEL,
+        temperature=0,
+        top_p=1,
+        max_tokens=256,
+        response_model=AssistantRequestPlan
     )
 
-def process_assistant_request(user_input: str) -> Optional[AssistantResponse]:
+    logger.info('Request split into: %s', [request.request_type for request in result.requests])
+
+    return result
+
+# Request type to handler dispatch table
+HANDLERS = {
+    'light_config': handle_light_config,
+    'door_config': handle_door_config,
+    'entertainment_config': handle_entertainment_config,
+}
+
+async def process_assistant_request(user_input: str) -> Optional[AssistantResponse]:
     """Main function implementing the routing workflow"""
     logger.info('Processing assistant request')
 
-    # Route the request
-    route_result = route_agent_request(user_input=user_input)
+    # Fast path: route locally, only the handler needs an LLM call
+    route_result = await fast_route(user_input=user_input)
+
+    if route_result is None:
+        # Route and extract the details in a single LLM call
+        command = await interpret_agent_request(user_input=user_input)
+        if command.confidence_score >= 0.7:
+            if command.details is not None:
+                return build_response(command.details)
+            if command.request_type == 'other':
+                logger.warning("Request type is not supported")
+                return None
+
+        # Fall back to the two-call path: router LLM call, then the handler
+        route_result = await route_agent_request(user_input=user_input)
 
     # Check confidence threshold
     if route_result.confidence_score < 0.7:
-        logger.warning(f'Low confidence score: {route_result.confidence_score}')
+        logger.warning('Low confidence score: %s', route_result.confidence_score)
         return None
     
     # Route to appropriate handler
-    if route_result.request_type == 'light_config':
-        return handle_light_config(route_result.description)
-    elif route_result.request_type == 'door_config':
-        return handle_door_config(route_result.description)
-    elif route_result.request_type == 'entertainment_config':
-        return handle_entertainment_config(route_result.description)
-    else:
+    handler = HANDLERS.get(route_result.request_type)
+    if handler is None:
         logger.warning("Request type is not supported")
         return None
-    
+    return await handler(route_result.description)
+
+# Responses carry device actions, a similar input ("unlock" vs "lock") must not reuse one
+@semantic_cache(threshold=None, namespace='process_assistant_request')
+async def cached_process(user_input: str) -> Optional[AssistantResponse]:
+    """Routing workflow that answers repeated requests from cache"""
+    return await process_assistant_request(user_input=user_input)
+
+def failed_as_none(results: list, inputs: list[str]) -> list[Optional[AssistantResponse]]:
+    """Log the requests that raised and replace their results with None"""
+    responses = []
+    for user_input, result in zip(inputs, results):
+        if isinstance(result, Exception):
+            logger.error('Request failed: %s: %s', user_input, result)
+            result = None
+        responses.append(result)
+    return responses
+
+async def process_assistant_commands(user_input: str) -> list[Optional[AssistantResponse]]:
+    """Routing workflow for inputs with several commands, handlers run concurrently"""
+    logger.info('Processing multi-command assistant request')
+
+    plan = await split_agent_request(user_input=user_input)
+
+    commands = []
+    for request in plan.requests:
+        if request.confidence_score < 0.7 or request.request_type not in HANDLERS:
+            logger.warning('Skipping command: %s', request.description)
+            continue
+        commands.append(request)
+
+    # The handlers are independent LLM calls, total latency is the slowest one
+    results = await asyncio.gather(
+        *(HANDLERS[request.request_type](request.description) for request in commands),
+        return_exceptions=True
+    )
+    return failed_as_none(results, [request.description for request in commands])
+
+async def process_assistant_requests(inputs: list[str]) -> list[Optional[AssistantResponse]]:
+    """Process several independent requests concurrently"""
+    # A failing request must not discard the results of the others
+    results = await asyncio.gather(
+        *(cached_process(user_input=user_input) for user_input in inputs),
+        return_exceptions=True
+    )
+    return failed_as_none(results, inputs)
+
 # Testing
 
-# Test with light configuration change request
-user_input = 'Change bedroom light to cool'
-result = process_assistant_request(user_input=user_input)
-if result:
-    print(f'Response: {result.message}')
-
-# Test with door configuration change request
-user_input = 'lock the front door'
-result = process_assistant_request(user_input=user_input)
-if result:
-    print(f'Response: {result.message}')
-
-# Test with entertainment configuration change request
-user_input = 'play some jazz'
-result = process_assistant_request(user_input=user_input)
-if result:
-    print(f'Response: {result.message}')
\ No newline at end of file
+async def main():
+    # Test with light, door and entertainment configuration change requests
+    results = await process_assistant_requests([
+        'Change bedroom light to cool',
+        'lock the front door',
+        'play some jazz'
+    ])
+    for result in results:
+        if result:
+            print(f'Response: {result.message}')
+
+    # Test with multiple commands in one request
+    user_input = 'turn the living room light warm and lock the front door'
+    for result in await process_assistant_commands(user_input=user_input):
+        if result:
+            print(f'Response: {result.message}')
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,20 @@
+"""Sentence embeddings served by the local Ollama instance"""
+import numpy as np
+
+from core.llm_client import OrjsonAsyncClient
+
+EMBEDDING_MODEL = 'nomic-embed-text'
+
+_async_client = OrjsonAsyncClient()
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length so dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+async def async_embed_texts(texts: list[str], model: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Return normalized embeddings, one row per text"""
+    response = await _async_client.embed(model=model, input=texts)
+    return normalize(np.asarray(response.embeddings, dtype=np.float32))
@@ -0,0 +1,192 @@
+"""Exact-match response cache for deterministic LLM calls"""
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+import diskcache
+import orjson
+from pydantic import TypeAdapter
+
+from core.llm_client import llm_retry
+
+
+class LLMCache:
+    """Cache LLM responses keyed by a hash of the full request.
+
+    Hot keys are kept in an in-process LRU dict, everything else is persisted
+    with diskcache so repeated runs of a script skip the LLM call entirely.
+    """
+
+    def __init__(
+        self,
+        directory: str = './.llm_cache',
+        ttl: Optional[float] = None,
+        max_hot_keys: int = 256
+    ) -> None:
+        self._disk = diskcache.Cache(directory)
+        self._hot: OrderedDict[str, str] = OrderedDict()
+        self.ttl = ttl
+        self.max_hot_keys = max_hot_keys
+
+    @staticmethod
+    def cache_key(
+        model: str,
+        messages: list[dict[str, Any]],
+        temperature: Optional[float],
+        format_schema: Optional[dict[str, Any]],
+        options: Optional[dict[str, Any]] = None
+    ) -> Optional[str]:
+        """Return the request hash, or None when the request is not deterministic.
+
+        Only requests with an explicit temperature of 0 are cached, since the
+        server default temperature samples a different response every call.
+        """
+        if temperature is None or temperature > 0:
+            return None
+
+        payload = {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'format': format_schema,
+            'options': options
+        }
+        return hashlib.sha256(
+            orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response content, or None on a miss"""
+        if key in self._hot:
+            self._hot.move_to_end(key)
+            return self._hot[key]
+
+        value = self._disk.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store the response content in both cache tiers"""
+        self._disk.set(key, value, expire=self.ttl)
+        self._remember(key, value)
+
+    def _remember(self, key: str, value: str) -> None:
+        self._hot[key] = value
+        self._hot.move_to_end(key)
+        if len(self._hot) > self.max_hot_keys:
+            self._hot.popitem(last=False)
+
+
+@lru_cache(maxsize=None)
+def _json_schema(response_format) -> dict[str, Any]:
+    """JSON schema of a response model, built once per model class"""
+    return response_format.model_json_schema()
+
+
+def _validated(content: str, adapter: Optional[TypeAdapter]) -> Any:
+    """Validate content with the adapter, raising before anything is cached"""
+    return content if adapter is None else adapter.validate_json(content)
+
+
+@lru_cache(maxsize=1)
+def default_cache() -> LLMCache:
+    """Process-wide cache shared by all call sites"""
+    return LLMCache()
+
+
+async def cached_chat(
+    client,
+    model: str,
+    messages: list[dict[str, Any]],
+    format: Optional[dict[str, Any]] = None,
+    options: Optional[dict[str, Any]] = None,
+    cache: Optional[LLMCache] = None,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    adapter: Optional[TypeAdapter] = None,
+    **kwargs
+) -> Any:
+    """Cached ollama `AsyncClient.chat` returning the response content.
+
+    With `on_chunk` the response is streamed and every chunk of content is
+    passed to it as it is generated. A cache hit passes the whole content
+    in one chunk. With `adapter` the content is validated and the validated
+    value is returned; only content that validates is cached. Responses cut
+    off by `num_predict` are never cached.
+    """
+    cache = cache or default_cache()
+    key = cache.cache_key(
+        model, messages, (options or {}).get('temperature'), format, options
+    )
+    if key is not None and (content := cache.get(key)) is not None:
+        if on_chunk is not None:
+            on_chunk(content)
+        return _validated(content, adapter)
+
+    if on_chunk is None:
+        response = await client.chat(
+            model=model,
+            messages=messages,
+            format=format,
+            options=options,
+            **kwargs
+        )
+        content = response.message.content
+        done_reason = response.done_reason
+    else:
+        chunks = []
+        done_reason = None
+        async for part in await client.chat(
+            model=model,
+            messages=messages,
+            format=format,
+            options=options,
+            stream=True,
+            **kwargs
+        ):
+            on_chunk(part.message.content)
+            chunks.append(part.message.content)
+            done_reason = part.done_reason
+        content = ''.join(chunks)
+
+    result = _validated(content, adapter)
+    if key is not None and done_reason != 'length':
+        cache.set(key, content)
+    return result
+
+
+async def cached_parse(
+    client,
+    model: str,
+    messages: list[dict[str, Any]],
+    response_format,
+    temperature: Optional[float] = None,
+    cache: Optional[LLMCache] = None,
+    adapter: Optional[TypeAdapter] = None,
+    **kwargs
+) -> Any:
+    """Cached `AsyncOpenAI.beta.chat.completions.parse` returning the response content.
+
+    With `adapter` the content is validated and the validated value is
+    returned; only content that validates is cached.
+    """
+    cache = cache or default_cache()
+    key = cache.cache_key(
+        model, messages, temperature, _json_schema(response_format), kwargs
+    )
+    if key is not None and (content := cache.get(key)) is not None:
+        return _validated(content, adapter)
+
+    response = await llm_retry(client.beta.chat.completions.parse)(
+        model=model,
+        messages=messages,
+        response_format=response_format,
+        temperature=temperature,
+        **kwargs
+    )
+    content = response.choices[0].message.content
+    result = _validated(content, adapter)
+    if key is not None:
+        cache.set(key, content)
+    return result
@@ -0,0 +1,133 @@
+"""LLM client construction shared by the scripts"""
+from functools import lru_cache
+from typing import Any, TypeVar
+
+import httpx
+import openai
+import orjson
+from ollama import AsyncClient
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+try:
+    # SDK-internal helper, checked against openai==1.61.1 (requirements.txt). It
+    # builds the exact strict schema `beta.chat.completions.parse` sends.
+    from openai.lib._pydantic import to_strict_json_schema
+except ImportError:
+    to_strict_json_schema = None
+
+T = TypeVar('T', bound=BaseModel)
+
+# Ollama's OpenAI compatible API
+OPENAI_BASE_URL = 'http://localhost:11434/v1'
+OPENAI_API_KEY = 'ollama'
+
+# Sized for asyncio.gather fan-out: concurrent requests reuse pooled keep-alive
+# connections instead of opening a new socket per call
+_LIMITS = httpx.Limits(max_connections=256, max_keepalive_connections=128)
+_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# Transient failures retry only the failed call, the other stages keep their results
+_TRANSIENT_ERRORS = (
+    httpx.TransportError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+llm_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.2, max=2.0),
+    retry=retry_if_exception_type(_TRANSIENT_ERRORS),
+    reraise=True
+)
+
+
+class OrjsonAsyncClient(AsyncClient):
+    """ollama `AsyncClient` that encodes requests and decodes responses with orjson.
+
+    Every chat request carries the full messages list and response schema,
+    which the stock client serializes with the stdlib json module.
+    """
+
+    async def _request(self, cls, *args, stream: bool = False, **kwargs):
+        if 'json' in kwargs:
+            kwargs['content'] = orjson.dumps(kwargs.pop('json'))
+        if stream:
+            return await super()._request(cls, *args, stream=True, **kwargs)
+        response = await self._request_raw(*args, **kwargs)
+        return cls(**orjson.loads(response.content))
+
+
+@lru_cache(maxsize=1)
+def get_async_client() -> AsyncOpenAI:
+    """Process-wide AsyncOpenAI client, all callers share one connection pool.
+
+    The SDK's own retries are disabled, `llm_retry` is the single retry policy.
+    """
+    return AsyncOpenAI(
+        base_url=OPENAI_BASE_URL,
+        api_key=OPENAI_API_KEY,
+        max_retries=0,
+        http_client=httpx.AsyncClient(limits=_LIMITS, timeout=_TIMEOUT)
+    )
+
+
+@lru_cache(maxsize=None)
+def response_format(model: type[BaseModel]) -> dict:
+    """`response_format` request parameter for a model, as `parse()` sends it.
+
+    Needed wherever a request body is built by hand instead of through
+    `client.beta.chat.completions.parse`. If a later SDK release drops the
+    strict schema helper, the plain pydantic schema is sent in non-strict mode.
+    """
+    if to_strict_json_schema is None:
+        schema, strict = model.model_json_schema(), False
+    else:
+        schema, strict = to_strict_json_schema(model), True
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': model.__name__,
+            'schema': schema,
+            'strict': strict
+        }
+    }
+
+
+def parse_completion(response: ChatCompletion, response_model: type[T]) -> T:
+    """Validate a structured chat completion into `response_model`.
+
+    Like `beta.chat.completions.parse`, a response cut off by `max_tokens` or
+    the content filter raises the SDK's finish reason errors, and a refusal
+    raises instead of failing validation.
+    """
+    choice = response.choices[0]
+    if choice.finish_reason == 'length':
+        raise openai.LengthFinishReasonError(completion=response)
+    if choice.finish_reason == 'content_filter':
+        raise openai.ContentFilterFinishReasonError()
+    if choice.message.refusal:
+        raise ValueError(f'{response_model.__name__} request refused: {choice.message.refusal}')
+    if choice.message.content is None:
+        raise ValueError(f'{response_model.__name__} response has no content')
+    return response_model.model_validate_json(choice.message.content)
+
+
+@llm_retry
+async def parse(
+    client: AsyncOpenAI,
+    model: str,
+    messages: list[dict[str, Any]],
+    response_model: type[T],
+    **kwargs
+) -> T:
+    """Structured chat completion validated into `response_model`, retried on transient errors"""
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format=response_format(response_model),
+        **kwargs
+    )
+    return parse_completion(response, response_model)
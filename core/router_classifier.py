@@ -0,0 +1,95 @@
+"""Embedding-based intent classifier used to skip the LLM router for easy inputs"""
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+from core.embeddings import async_embed_texts
+
+
+class RouterClassifier:
+    """Multinomial logistic regression on sentence embeddings.
+
+    Trained on a few labeled seed examples per label the first time it is
+    used, which takes one batched embedding call and a few milliseconds of
+    gradient descent.
+
+    With a few dozen seeds in hundreds of dimensions the softmax saturates
+    for almost any input, so the probability alone says little. A prediction
+    only keeps its confidence when the nearest seed example is at least
+    ``min_similarity`` cosine-similar and carries the same label, otherwise
+    the confidence is 0.
+    """
+
+    def __init__(
+        self,
+        examples: dict[str, list[str]],
+        epochs: int = 100,
+        learning_rate: float = 0.5,
+        l2: float = 0.1,
+        min_similarity: float = 0.75
+    ) -> None:
+        self.examples = examples
+        self.labels = list(examples)
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.min_similarity = min_similarity
+        self._seeds: Optional[np.ndarray] = None
+        self._seed_targets: Optional[np.ndarray] = None
+        self._mean: Optional[np.ndarray] = None
+        self._std: Optional[np.ndarray] = None
+        self._weights: Optional[np.ndarray] = None
+        self._bias: Optional[np.ndarray] = None
+        self._fit_lock = asyncio.Lock()
+
+    async def fit(self) -> 'RouterClassifier':
+        """Train the classifier on the seed examples"""
+        texts = [text for label in self.labels for text in self.examples[label]]
+        targets = np.array([
+            index
+            for index, label in enumerate(self.labels)
+            for _ in self.examples[label]
+        ])
+        features = await async_embed_texts(texts)
+        self._seeds = features
+        self._seed_targets = targets
+
+        self._mean = features.mean(axis=0)
+        self._std = features.std(axis=0) + 1e-6
+        features = (features - self._mean) / self._std
+
+        one_hot = np.eye(len(self.labels))[targets]
+        self._weights = np.zeros((features.shape[1], len(self.labels)))
+        self._bias = np.zeros(len(self.labels))
+        for _ in range(self.epochs):
+            error = self._softmax(features @ self._weights + self._bias) - one_hot
+            self._weights -= self.learning_rate * (
+                features.T @ error / len(texts) + self.l2 * self._weights
+            )
+            self._bias -= self.learning_rate * error.mean(axis=0)
+        return self
+
+    async def predict(self, text: str) -> tuple[str, float]:
+        """Return the most likely label and its gated probability"""
+        # Concurrent first calls share a single training run
+        async with self._fit_lock:
+            if self._weights is None:
+                await self.fit()
+
+        embedding = (await async_embed_texts([text]))[0]
+        features = (embedding - self._mean) / self._std
+        probabilities = self._softmax(features @ self._weights + self._bias)
+        best = int(np.argmax(probabilities))
+
+        # Embeddings are unit length, so the dot product is the cosine similarity
+        similarities = self._seeds @ embedding
+        nearest = int(np.argmax(similarities))
+        if similarities[nearest] < self.min_similarity or self._seed_targets[nearest] != best:
+            return self.labels[best], 0.0
+        return self.labels[best], float(probabilities[best])
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
@@ -0,0 +1,178 @@
+"""Data models shared by the example scripts"""
+from dataclasses import dataclass
+from typing import Annotated, Literal, Optional, Union
+
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field
+
+def _unit_interval(value: float) -> float:
+    """Rescale a percentage to 0-1 and clamp the result"""
+    if value > 1:
+        value /= 100
+    return min(max(value, 0.0), 1.0)
+
+# Decoding grammars only enforce integer bounds, so a float range in the schema
+# doesn't stop a model from answering 85. Out of range scores are fixed up
+# after decoding instead of failing validation.
+ConfidenceScore = Annotated[float, AfterValidator(_unit_interval)]
+
+# Routing models
+
+class RequestRoute(BaseModel):
+    """Router LLM  call: Determine the type of assistant request"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    request_type: Literal['light_config', 
+                          'door_config', 
+                          'entertainment_config',
+                          'other'] = Field(
+                              description='Type of assistant request'
+                          )
+    confidence_score: ConfidenceScore = Field(
+        description='Confidence score of the request type selection between 0 and 1'
+    )
+
+class AssistantRequestType(RequestRoute):
+    """Type of an assistant request together with the request text for its handler"""
+
+    description: str = Field(
+        description='Cleand request text'
+    )
+
+class AssistantRequestPlan(BaseModel):
+    """Router LLM call: Split a multi-command request into individual requests"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    requests: list[AssistantRequestType] = Field(
+        description='One entry per individual command in the request'
+    )
+
+class LightConfigDetails(BaseModel):
+    """Details of a light configuration change"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    request_type: Literal['light_config'] = Field(
+        description='Type of assistant request'
+    )
+    place: str = Field(
+        description='Place of the house where the light config change should be happened'
+    )
+    light_type: Literal['warm', 'cool'] = Field(
+        description='Type of the light'
+    )
+
+class DoorConfigDetails(BaseModel):
+    """Details of a door configuration change"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    request_type: Literal['door_config'] = Field(
+        description='Type of assistant request'
+    )
+    place: str = Field(
+        description='Place of the house where the door config change should be happened'
+    )
+    action: Literal['lock', 'unlock'] = Field(
+        description='Action to be performed on the door lock'
+    )
+
+class EntertainmentConfigDetails(BaseModel):
+    """Details of a entertainment system configuration change"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    request_type: Literal['entertainment_config'] = Field(
+        description='Type of assistant request'
+    )
+    action: Literal['play', 'stop', 'pause'] = Field(
+        description='Action to be performed on the entertainment system'
+    )
+    genre: Optional[str]  = Field(
+        description='Requsted genre to be played'
+    )
+
+class AssistantCommand(BaseModel):
+    """Router and handler in one LLM call: request type with its configuration details"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    request_type: Literal['light_config',
+                          'door_config',
+                          'entertainment_config',
+                          'other'] = Field(
+                              description='Type of assistant request'
+                          )
+    confidence_score: ConfidenceScore = Field(
+        description='Confidence score of the request type selection between 0 and 1'
+    )
+    details: Optional[Annotated[
+        Union[LightConfigDetails, DoorConfigDetails, EntertainmentConfigDetails],
+        Field(discriminator='request_type')
+    ]] = Field(
+        default=None,
+        description='Configuration change details, null for other requests'
+    )
+
+@dataclass(slots=True)
+class AssistantResponse:
+    """Final response format, built from handler results so it skips validation"""
+
+    # Whether the configuration chage is successful
+    status: str
+    # User-friendly message
+    message: str
+
+# Validation models
+
+class AssistantRequestValidation(BaseModel):
+    """Validation details of the user input for the assistant"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    is_assistant_request: bool = Field(
+        description='Whether this is a valid assistant request.'
+    )
+    confidence_score: ConfidenceScore = Field(
+        description='Confidence score between 0 and 1'
+    )
+
+class SecurityCheck(BaseModel):
+    """Check for prompt injection or system manipulation attempts"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    is_safe: bool = Field(
+        description='Whether the input appears safe'
+    )
+    risk_flags: list[str] = Field(
+        description='List of potential security concerns'
+    )
+
+class InputTriage(BaseModel):
+    """Validation, security check and routing of the user input in one call"""
+
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+    is_assistant_request: bool = Field(
+        description='Whether this is a valid assistant request.'
+    )
+    confidence_score: ConfidenceScore = Field(
+        description='Confidence score between 0 and 1'
+    )
+    is_safe: bool = Field(
+        description='Whether the input appears safe'
+    )
+    risk_flags: list[str] = Field(
+        description='List of potential security concerns'
+    )
+    request_type: Literal['light_config',
+                          'door_config',
+                          'entertainment_config',
+                          'other'] = Field(
+        description='Type of the assistant request'
+    )
+    description: str = Field(
+        description='Cleaned description of the request'
+    )
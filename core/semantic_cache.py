@@ -0,0 +1,152 @@
+"""Embedding-similarity cache for LLM calls driven by free-form user input"""
+import inspect
+import logging
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Optional, get_type_hints
+
+import numpy as np
+from ollama import ResponseError
+from pydantic import TypeAdapter
+
+from core.embeddings import async_embed_texts
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Responses indexed by the normalized embedding of the input that produced them.
+
+    A lookup is an exact inner-product search over all stored embeddings, so
+    the best match is the stored input with the highest cosine similarity.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        threshold: float = 0.92,
+        directory: str = './.sem_cache'
+    ) -> None:
+        self.threshold = threshold
+        self.path = Path(directory) / f'{namespace}.npz'
+        self._embeddings: Optional[np.ndarray] = None
+        self._responses: list[str] = []
+
+        if self.path.exists():
+            with np.load(self.path) as data:
+                self._embeddings = data['embeddings']
+                self._responses = data['responses'].tolist()
+
+    def lookup(self, vector: np.ndarray) -> Optional[str]:
+        """Return the response of the most similar stored input above the threshold"""
+        if self._embeddings is None:
+            return None
+
+        scores = self._embeddings @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return self._responses[best]
+
+    def add(self, vector: np.ndarray, response: str) -> None:
+        """Store a response and persist the index"""
+        if self._embeddings is None:
+            self._embeddings = vector[np.newaxis, :]
+        else:
+            self._embeddings = np.vstack([self._embeddings, vector])
+        self._responses.append(response)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            self.path,
+            embeddings=self._embeddings,
+            responses=np.array(self._responses)
+        )
+
+
+def normalize_text(text: str) -> str:
+    """Key used by the exact-match tier"""
+    return ' '.join(text.lower().split())
+
+
+def semantic_cache(
+    threshold: Optional[float] = 0.92,
+    namespace: Optional[str] = None,
+    max_exact: int = 1024
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Cache an async function on the embedding of its first argument.
+
+    Repeated inputs that only differ in case or whitespace are answered from
+    an in-memory exact-match tier before any embedding is computed. The
+    function's return annotation is used to serialize results to JSON and
+    to rebuild them on a cache hit. Each namespace gets its own index so
+    results of different functions never mix. None results are not cached.
+    A threshold of None keeps only the exact-match tier, for results that
+    must not be reused for a merely similar input.
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        if not inspect.iscoroutinefunction(func):
+            raise TypeError(f'semantic_cache needs an async function, got {func.__name__}')
+        cache = None if threshold is None else SemanticCache(namespace or func.__name__, threshold)
+        adapter = TypeAdapter(get_type_hints(func)['return'])
+        signature = inspect.signature(func)
+        exact: OrderedDict[str, str] = OrderedDict()
+
+        def first_argument(args, kwargs) -> str:
+            return next(iter(signature.bind(*args, **kwargs).arguments.values()))
+
+        def lookup_exact(text: str) -> Any:
+            key = normalize_text(text)
+            if (cached := exact.get(key)) is None:
+                return None
+            exact.move_to_end(key)
+            logger.info("Exact cache hit for %s", func.__name__)
+            return adapter.validate_json(cached)
+
+        def lookup(vector: np.ndarray) -> Any:
+            if (cached := cache.lookup(vector)) is not None:
+                logger.info("Semantic cache hit for %s", func.__name__)
+                return adapter.validate_json(cached)
+            return None
+
+        def remember(text: str, serialized: str) -> None:
+            exact[normalize_text(text)] = serialized
+            if len(exact) > max_exact:
+                exact.popitem(last=False)
+
+        def store(text: str, vector: Optional[np.ndarray], result: Any) -> None:
+            if result is None:
+                return
+            serialized = adapter.dump_json(result).decode()
+            remember(text, serialized)
+            if vector is not None:
+                cache.add(vector, serialized)
+
+        def disabled(error: Exception) -> None:
+            logger.warning("Semantic cache disabled for %s: %s", func.__name__, error)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            text = first_argument(args, kwargs)
+            if (cached := lookup_exact(text)) is not None:
+                return cached
+
+            vector = None
+            if cache is not None:
+                try:
+                    vector = (await async_embed_texts([text]))[0]
+                except ResponseError as e:
+                    disabled(e)
+                else:
+                    if (cached := lookup(vector)) is not None:
+                        remember(text, adapter.dump_json(cached).decode())
+                        return cached
+
+            result = await func(*args, **kwargs)
+            store(text, vector, result)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,165 @@
+"""Incremental parser for a JSON object streamed in chunks by an LLM"""
+import json
+from typing import Any, Callable, Optional
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class StreamingJsonParser:
+    """Parse a JSON object as it arrives, without waiting for the full response.
+
+    `on_text(field, text)` receives the decoded text of top-level string
+    fields as soon as it is generated, `on_field(field, value)` receives each
+    top-level field once its value is complete. Completed top-level fields
+    are also collected in `fields`.
+    """
+
+    def __init__(
+        self,
+        on_text: Optional[Callable[[str, str], None]] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> None:
+        self.on_text = on_text
+        self.on_field = on_field
+        self.fields: dict[str, Any] = {}
+        self._depth = 0
+        self._expect: Optional[str] = None
+        self._in_string = False
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        self._role: Optional[str] = None
+        self._key: list[str] = []
+        self._field = ''
+        self._raw: Optional[list[str]] = None
+
+    def feed(self, chunk: str) -> None:
+        """Consume the next chunk of the response"""
+        deltas: list[tuple[str, str]] = []
+        for ch in chunk:
+            self._consume(ch, deltas)
+
+        if self.on_text is None:
+            return
+        text: list[str] = []
+        field = None
+        for delta_field, char in deltas:
+            if delta_field != field and text:
+                self.on_text(field, ''.join(text))
+                text = []
+            field = delta_field
+            text.append(char)
+        if text:
+            self.on_text(field, ''.join(text))
+
+    def _consume(self, ch: str, deltas: list[tuple[str, str]]) -> None:
+        if self._in_string:
+            self._capture(ch)
+            if self._unicode is not None:
+                self._unicode += ch
+                if len(self._unicode) == 4:
+                    self._code_point(int(self._unicode, 16), deltas)
+                    self._unicode = None
+            elif self._escape:
+                self._escape = False
+                if ch == 'u':
+                    self._unicode = ''
+                else:
+                    self._char(_ESCAPES.get(ch, ch), deltas)
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._flush_surrogate(deltas)
+                self._in_string = False
+                if self._role == 'key':
+                    self._field = ''.join(self._key)
+                elif self._role == 'value':
+                    self._finish()
+            else:
+                self._char(ch, deltas)
+            return
+
+        if ch.isspace():
+            self._capture(ch)
+        elif ch == ':' and self._depth == 1:
+            self._expect = 'value'
+        elif ch == ',' and self._depth == 1:
+            if self._raw is not None:
+                self._finish()
+            self._expect = 'key'
+        elif ch == '"':
+            self._in_string = True
+            self._role = None
+            if self._depth == 1 and self._expect == 'key':
+                self._role = 'key'
+                self._key = []
+            elif self._depth == 1 and self._expect == 'value':
+                self._role = 'value'
+                self._start(ch)
+            else:
+                self._capture(ch)
+        elif ch in '{[':
+            if self._depth == 0:
+                self._expect = 'key'
+            elif self._depth == 1 and self._expect == 'value':
+                self._start(ch)
+            else:
+                self._capture(ch)
+            self._depth += 1
+        elif ch in '}]':
+            self._depth -= 1
+            if self._depth == 0:
+                if self._raw is not None:
+                    self._finish()
+            else:
+                self._capture(ch)
+                if self._depth == 1 and self._raw is not None:
+                    self._finish()
+        elif self._depth == 1 and self._expect == 'value':
+            self._start(ch)
+        else:
+            self._capture(ch)
+
+    def _start(self, ch: str) -> None:
+        self._raw = [ch]
+        self._expect = None
+
+    def _capture(self, ch: str) -> None:
+        if self._raw is not None:
+            self._raw.append(ch)
+
+    def _code_point(self, code: int, deltas: list[tuple[str, str]]) -> None:
+        """Decode a \\u escape, joining a UTF-16 surrogate pair into one character"""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            self._append(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)), deltas)
+        elif 0xD800 <= code < 0xDC00:
+            self._flush_surrogate(deltas)
+            self._high_surrogate = code
+        elif 0xDC00 <= code < 0xE000:
+            self._char('\ufffd', deltas)
+        else:
+            self._char(chr(code), deltas)
+
+    def _flush_surrogate(self, deltas: list[tuple[str, str]]) -> None:
+        """Replace a high surrogate that isn't followed by a low one"""
+        if self._high_surrogate is not None:
+            self._high_surrogate = None
+            self._append('\ufffd', deltas)
+
+    def _char(self, ch: str, deltas: list[tuple[str, str]]) -> None:
+        self._flush_surrogate(deltas)
+        self._append(ch, deltas)
+
+    def _append(self, ch: str, deltas: list[tuple[str, str]]) -> None:
+        if self._role == 'key':
+            self._key.append(ch)
+        elif self._role == 'value':
+            deltas.append((self._field, ch))
+
+    def _finish(self) -> None:
+        value = json.loads(''.join(self._raw))
+        self._raw = None
+        self.fields[self._field] = value
+        if self.on_field is not None:
+            self.on_field(self._field, value)
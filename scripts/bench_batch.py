@@ -0,0 +1,143 @@
+"""Offline batch run of the routing test prompts.
+
+The prompts are serialized as OpenAI Batch API JSONL lines, submitted as one
+file and polled until the batch completes. Ollama has no batch endpoint, so
+against a local server the same lines are sent concurrently instead.
+
+Run from the repository root:
+
+    python -m scripts.bench_batch
+"""
+import asyncio
+import importlib
+import logging
+import time
+from typing import Union
+
+import orjson
+from openai import NotFoundError, OpenAIError
+from openai.types.chat import ChatCompletion
+
+from core.llm_client import parse, parse_completion, response_format
+from core.schemas import AssistantCommand
+
+routing = importlib.import_module('3-routing')
+
+logger = logging.getLogger(__name__)
+
+client = routing.client
+POLL_INTERVAL = 10.0
+
+INPUTS = [
+    'Change bedroom light to cool',
+    'lock the front door',
+    'play some jazz',
+    'turn the living room light warm',
+    'unlock the back door',
+    'What is the weather like today',
+]
+
+def build_batch(inputs: list[str]) -> list[dict]:
+    """One Batch API request line per input, using the fused command call"""
+    return [
+        {
+            'custom_id': f'request-{i}',
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {
+                'model': routing.HANDLER_MODEL,
+                'messages': [
+                    {'role': 'system', 'content': routing.COMMAND_SYSTEM_PROMPT},
+                    {'role': 'user', 'content': user_input}
+                ],
+                'temperature': 0,
+                'max_tokens': 192,
+                'response_format': response_format(AssistantCommand)
+            }
+        }
+        for i, user_input in enumerate(inputs)
+    ]
+
+def command_from_line(line: dict) -> AssistantCommand:
+    """Validate one line of the batch output file"""
+    if line.get('error'):
+        raise RuntimeError(f"Batch request failed: {line['error']}")
+    response = line['response']
+    if response['status_code'] != 200:
+        raise RuntimeError(f"Batch request failed with status {response['status_code']}")
+    return parse_completion(ChatCompletion.model_validate(response['body']), AssistantCommand)
+
+async def submit_batch(lines: list[dict]) -> dict[str, Union[AssistantCommand, Exception]]:
+    """Upload the lines as a batch file and wait for the results"""
+    batch_file = await client.files.create(
+        file=('routing_batch.jsonl', b'\n'.join(orjson.dumps(line) for line in lines)),
+        purpose='batch'
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window='24h'
+    )
+    logger.info('Submitted batch %s with %d requests', batch.id, len(lines))
+
+    while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+        await asyncio.sleep(POLL_INTERVAL)
+        batch = await client.batches.retrieve(batch.id)
+        logger.info('Batch %s is %s', batch.id, batch.status)
+
+    if batch.status != 'completed':
+        raise RuntimeError(f'Batch {batch.id} ended with status {batch.status}')
+
+    output = await client.files.content(batch.output_file_id)
+    results = {}
+    for raw in output.text.splitlines():
+        line = orjson.loads(raw)
+        try:
+            results[line['custom_id']] = command_from_line(line)
+        except (KeyError, RuntimeError, ValueError, OpenAIError) as e:
+            results[line['custom_id']] = e
+    return results
+
+async def run_concurrently(lines: list[dict]) -> dict[str, Union[AssistantCommand, Exception]]:
+    """Send the batch lines as concurrent structured chat completions"""
+    # A failing line must not cancel the others' in-flight requests
+    commands = await asyncio.gather(
+        *(
+            parse(
+                client,
+                model=line['body']['model'],
+                messages=line['body']['messages'],
+                temperature=line['body']['temperature'],
+                max_tokens=line['body']['max_tokens'],
+                response_model=AssistantCommand
+            )
+            for line in lines
+        ),
+        return_exceptions=True
+    )
+    return {line['custom_id']: command for line, command in zip(lines, commands)}
+
+async def main():
+    lines = build_batch(INPUTS)
+    start = time.perf_counter()
+    try:
+        results = await submit_batch(lines)
+    except NotFoundError:
+        logger.info('Batch API not available, sending requests concurrently')
+        results = await run_concurrently(lines)
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for user_input, line in zip(INPUTS, lines):
+        command = results.get(line['custom_id'], RuntimeError('No result in the batch output'))
+        if isinstance(command, Exception):
+            failed += 1
+            logger.error('Request failed: %s: %s', user_input, command)
+        elif command.details is None:
+            print(f'{user_input!r}: {command.request_type}')
+        else:
+            print(f'{user_input!r}: {routing.build_response(command.details).message}')
+    print(f'{len(lines)} requests in {elapsed:.2f}s, {failed} failed')
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,32 @@
+"""Word-count regression check on the prompt chaining system prompts.
+
+The limits are snapshots of the current prompts with a little headroom, so a
+prompt that grows by more than a few words fails here. Words and punctuation
+are counted, not tokens: a BPE tokenizer emits at least one token per piece,
+so the real token counts are this or higher.
+"""
+import importlib
+import re
+
+import pytest
+
+chaining = importlib.import_module('1-prompt-chaining')
+
+
+def word_count(text: str) -> int:
+    return len(re.findall(r'\w+|[^\w\s]', text))
+
+
+@pytest.mark.parametrize('prompt, limit', [
+    (chaining._VALIDATE_SYS, 16),
+    (chaining._EXTRACT_SYS, 12),
+    (chaining._CONFIRM_SYS, 18),
+    (chaining._COMBINED_SYS, 46),
+])
+def test_stage_instructions_do_not_grow(prompt, limit):
+    assert word_count(prompt) <= limit
+
+
+def test_shared_prefix_does_not_grow():
+    prefix = chaining.shared_prefix('Today is Wednesday, September 30, 2026')
+    assert word_count(prefix) <= 16
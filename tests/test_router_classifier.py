@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import core.router_classifier
+from core.router_classifier import RouterClassifier
+
+DIMENSIONS = 768
+LABELS = ['light_config', 'door_config', 'entertainment_config', 'other']
+SEEDS_PER_LABEL = 8
+
+rng = np.random.default_rng(0)
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+# Every embedding shares a common component, like real sentence embeddings do
+COMMON = unit(rng.normal(size=DIMENSIONS))
+CENTERS = unit(2 * COMMON + unit(rng.normal(size=(len(LABELS), DIMENSIONS))))
+
+
+def near(center: np.ndarray, spread: float) -> np.ndarray:
+    return unit(center + spread * unit(rng.normal(size=DIMENSIONS)))
+
+
+EXAMPLES = {
+    label: [f'{label} seed {i}' for i in range(SEEDS_PER_LABEL)]
+    for label in LABELS
+}
+VECTORS = {
+    text: near(center, 0.6)
+    for center, texts in zip(CENTERS, EXAMPLES.values())
+    for text in texts
+}
+
+
+@pytest.fixture
+def classifier(monkeypatch: pytest.MonkeyPatch) -> RouterClassifier:
+    async def fake_embed_texts(texts: list[str]) -> np.ndarray:
+        return np.stack([VECTORS[text] for text in texts])
+
+    monkeypatch.setattr(core.router_classifier, 'async_embed_texts', fake_embed_texts)
+    return RouterClassifier(EXAMPLES)
+
+
+def predict(classifier: RouterClassifier, vector: np.ndarray) -> tuple[str, float]:
+    VECTORS['query'] = vector
+    return asyncio.run(classifier.predict('query'))
+
+
+@pytest.mark.parametrize('index', range(len(LABELS)))
+def test_paraphrase_of_a_seed_passes_the_gate(classifier: RouterClassifier, index: int) -> None:
+    seed = VECTORS[EXAMPLES[LABELS[index]][0]]
+    label, confidence = predict(classifier, near(seed, 0.3))
+    assert label == LABELS[index]
+    assert confidence >= 0.8
+
+
+def test_off_distribution_inputs_fall_below_the_gate(classifier: RouterClassifier) -> None:
+    confidences = [
+        predict(classifier, unit(2 * COMMON + unit(rng.normal(size=DIMENSIONS))))[1]
+        for _ in range(50)
+    ]
+    assert max(confidences) < 0.8
+
+
+def test_similarity_gate_holds_without_regularization(classifier: RouterClassifier) -> None:
+    # A nearly unregularized softmax saturates, the nearest-seed check still rejects noise
+    classifier.epochs, classifier.l2 = 300, 1e-3
+    confidences = [
+        predict(classifier, unit(2 * COMMON + unit(rng.normal(size=DIMENSIONS))))[1]
+        for _ in range(50)
+    ]
+    assert max(confidences) < 0.8
@@ -0,0 +1,9 @@
+import pytest
+
+from core.schemas import AssistantRequestValidation
+
+
+@pytest.mark.parametrize('score, expected', [(0.85, 0.85), (85, 0.85), (1, 1.0), (250, 1.0), (-0.2, 0.0)])
+def test_confidence_score_is_rescaled_into_unit_interval(score: float, expected: float) -> None:
+    validation = AssistantRequestValidation(is_assistant_request=True, confidence_score=score)
+    assert validation.confidence_score == pytest.approx(expected)
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from core.streaming_json import StreamingJsonParser
+
+DOCUMENT = json.dumps({
+    'name': 'Team sync',
+    'confirmation_message': 'Booked "Team sync" {room 4}, see you\nthere \\o/ \u00e9 \U0001F600',
+    'participants': ['Alice', 'Bob, "the builder"'],
+    'location': {'room': '4', 'floor': [1, {'wing': 'a}b'}]},
+    'duration': 60,
+    'all_day': False,
+    'notes': None,
+})
+
+
+def parse(document: str, chunk_size: int) -> tuple[StreamingJsonParser, dict[str, str]]:
+    texts: dict[str, str] = {}
+
+    def on_text(field: str, text: str) -> None:
+        texts[field] = texts.get(field, '') + text
+
+    parser = StreamingJsonParser(on_text=on_text)
+    for i in range(0, len(document), chunk_size):
+        parser.feed(document[i:i + chunk_size])
+    return parser, texts
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, len(DOCUMENT)])
+def test_fields_match_json_loads_for_any_chunking(chunk_size):
+    parser, _ = parse(DOCUMENT, chunk_size)
+    assert parser.fields == json.loads(DOCUMENT)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, len(DOCUMENT)])
+def test_streams_decoded_text_of_top_level_strings(chunk_size):
+    _, texts = parse(DOCUMENT, chunk_size)
+    expected = json.loads(DOCUMENT)
+    assert texts == {
+        'name': expected['name'],
+        'confirmation_message': expected['confirmation_message'],
+    }
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 100])
+def test_joins_escaped_surrogate_pairs(chunk_size):
+    _, texts = parse('{"message": "hi \\ud83d\\ude00!"}', chunk_size)
+    assert texts['message'] == 'hi \U0001F600!'
+    texts['message'].encode('utf-8')
+
+
+def test_replaces_unpaired_surrogates():
+    parser, texts = parse('{"a": "x\\ud83dy", "b": "\\ude00", "c": "z\\ud83d"}', 1)
+    assert texts == {'a': 'x\ufffdy', 'b': '\ufffd', 'c': 'z\ufffd'}
+    assert set(parser.fields) == {'a', 'b', 'c'}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, len(DOCUMENT)])
+def test_on_field_receives_each_completed_field_in_order(chunk_size):
+    completed: list[tuple[str, object]] = []
+    parser = StreamingJsonParser(on_field=lambda field, value: completed.append((field, value)))
+    for i in range(0, len(DOCUMENT), chunk_size):
+        parser.feed(DOCUMENT[i:i + chunk_size])
+    assert completed == list(json.loads(DOCUMENT).items())
+
+
+def test_on_field_fires_before_the_object_is_closed():
+    completed: list[str] = []
+    parser = StreamingJsonParser(on_field=lambda field, value: completed.append(field))
+    parser.feed('{"name": "Team sync", "duration": 60')
+    assert completed == ['name']
+    parser.feed(', "notes": null}')
+    assert completed == ['name', 'duration', 'notes']
+
+
+def test_nested_values_do_not_emit_text():
+    parser, texts = parse('{"plan": {"steps": ["a", "b"]}, "done": true}', 1)
+    assert texts == {}
+    assert parser.fields == {'plan': {'steps': ['a', 'b']}, 'done': True}